@@ -2,28 +2,35 @@
 
 """Console script for satel_integra."""
 
+import argparse
 import logging
-import click
-from satel_integra import demo
+from satel_integra.satel_integra import demo
 
 
-@click.command()
-@click.option('--command', default="demo", help='Command on what to do.')
-@click.option('--ip', default='192.168.2.230',
-              help='Ip address of the ETHM module for SATEL Integra alarm.')
-@click.option('--port', default=7094, help='Port number of the Satel Integra.')
-@click.option('--loglevel', default='DEBUG', help='Logging level (python names).')
-def main(port, ip, command, loglevel):
+def main(args=None):
     """Console script for satel_integra."""
-    numeric_level = getattr(logging, loglevel.upper(), None)
+    parser = argparse.ArgumentParser(
+        description='Demo of satel_integra library')
+    parser.add_argument('--command', default="demo",
+                        help='Command on what to do.')
+    parser.add_argument('--ip', default='192.168.2.230',
+                        help='Ip address of the ETHM module for SATEL '
+                             'Integra alarm.')
+    parser.add_argument('--port', default=7094, type=int,
+                        help='Port number of the Satel Integra.')
+    parser.add_argument('--loglevel', default='DEBUG',
+                        help='Logging level (python names).')
+    options = parser.parse_args(args)
+
+    numeric_level = getattr(logging, options.loglevel.upper(), None)
     if not isinstance(numeric_level, int):
-        raise ValueError('Invalid log level: %s' % loglevel)
-        
+        parser.error('Invalid log level: %s' % options.loglevel)
+
     logging.basicConfig(level=numeric_level)
 
-    click.echo("Demo of satel_integra library")
-    if command == "demo":
-        demo(ip, port)
+    print("Demo of satel_integra library")
+    if options.command == "demo":
+        demo(options.ip, options.port)
 
 
 if __name__ == "__main__":
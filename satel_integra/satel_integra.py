@@ -4,41 +4,45 @@
 
 import asyncio
 import logging
+import random
 from enum import Enum, unique
+from functools import partial
 
 _LOGGER = logging.getLogger(__name__)
 
+FRAME_START = b'\xFE\xFE'
+FRAME_END = b'\xFE\x0D'
+FRAME_SPECIAL_BYTE = b'\xFE'
+FRAME_SPECIAL_BYTE_ESCAPED = b'\xFE\xF0'
+
 
 def checksum(command):
     """Function to calculate checksum as per Satel manual."""
     crc = 0x147A
     for b in command:
-        # rotate (crc 1 bit left)
-        crc = ((crc << 1) & 0xFFFF) | (crc & 0x8000) >> 15
-        crc = crc ^ 0xFFFF
+        # rotate (crc 1 bit left) and invert
+        crc = ((crc << 1) & 0xFFFF | crc >> 15) ^ 0xFFFF
         crc = (crc + (crc >> 8) + b) & 0xFFFF
     return crc
 
 
 def print_hex(data):
     """Debugging method to print out frames in hex."""
-    hex_msg = ""
-    for c in data:
-        hex_msg += "\\x" + format(c, "02x")
-    _LOGGER.debug(hex_msg)
+    _LOGGER.debug("".join("\\x%02x" % c for c in data))
 
 
 def verify_and_strip(resp):
     """Verify checksum and strip header and footer of received frame."""
-    if resp[0:2] != b'\xFE\xFE':
+    if resp[0:2] != FRAME_START:
         _LOGGER.error("Houston, we got problem:")
         print_hex(resp)
         raise Exception("Wrong header - got %X%X" % (resp[0], resp[1]))
-    if resp[-2:] != b'\xFE\x0D':
+    if resp[-2:] != FRAME_END:
         raise Exception("Wrong footer - got %X%X" % (resp[-2], resp[-1]))
-    output = resp[2:-2].replace(b'\xFE\xF0', b'\xFE')
+    output = resp[2:-2].replace(FRAME_SPECIAL_BYTE_ESCAPED,
+                                FRAME_SPECIAL_BYTE)
 
-    c = checksum(bytearray(output[0:-2]))
+    c = checksum(output[0:-2])
 
     if (256 * output[-2:-1][0] + output[-1:][0]) != c:
         raise Exception("Wrong checksum - got %d expected %d" % (
@@ -54,28 +58,37 @@ def list_set_bits(r, expected_length):
     on respective bit positions - as per Satel manual.
     """
     set_bit_numbers = []
-    bit_index = 0x1
     assert (len(r) == expected_length + 1)
 
-    for b in r[1:]:
-        for i in range(8):
-            if ((b >> i) & 1) == 1:
-                set_bit_numbers.append(bit_index)
-            bit_index += 1
+    bits = int.from_bytes(r[1:], 'little')
+    while bits:
+        # isolate and clear the lowest set bit
+        lowest = bits & -bits
+        set_bit_numbers.append(lowest.bit_length())
+        bits ^= lowest
 
     return set_bit_numbers
 
 
 def generate_query(command):
     """Add header, checksum and footer to command data."""
-    data = bytearray(command)
-    c = checksum(data)
-    data.append(c >> 8)
-    data.append(c & 0xFF)
-    data.replace(b'\xFE', b'\xFE\xF0')
+    c = checksum(command)
+    data = bytes(command) + bytes((c >> 8, c & 0xFF))
+    data = data.replace(FRAME_SPECIAL_BYTE, FRAME_SPECIAL_BYTE_ESCAPED)
+
+    return FRAME_START + data + FRAME_END
+
+
+# Frames with a fixed payload are built once instead of on every send.
+START_MONITORING_QUERY = generate_query(
+    b'\x7F\x01\xDC\x99\x80\x00\x04\x00\x00\x00\x00\x00\x00')
+# Command to read status of the alarm
+KEEP_ALIVE_QUERY = generate_query(b'\xEE\x01\x01')
 
-    data = bytearray.fromhex("FEFE") + data + bytearray.fromhex("FE0D")
-    return data
+
+def user_code_bytes(code):
+    """Return user code as 8 bytes, padded with 0xF digits."""
+    return bytes.fromhex(code.ljust(16, 'F'))
 
 
 def output_bytes(output):
@@ -111,16 +124,33 @@ class AlarmState(Enum):
     DISARMED = 10
 
 
+# Maps partition state message ids to the state they report.
+PARTITION_STATE_MESSAGES = {
+    0x0A: AlarmState.ARMED_MODE0,
+    0x2A: AlarmState.ARMED_MODE1,
+    0x0B: AlarmState.ARMED_MODE2,
+    0x0C: AlarmState.ARMED_MODE3,
+    0x09: AlarmState.ARMED_SUPPRESSED,
+    0x0E: AlarmState.ENTRY_TIME,
+    0x0F: AlarmState.EXIT_COUNTDOWN_OVER_10,
+    0x10: AlarmState.EXIT_COUNTDOWN_UNDER_10,
+    0x13: AlarmState.TRIGGERED,
+    0x14: AlarmState.TRIGGERED_FIRE,
+}
+
+
 class AsyncSatel:
     """Asynchronous interface to talk to Satel Integra alarm system."""
 
-    def __init__(self, host, port, loop, monitored_zones=[],
+    def __init__(self, host, port, loop=None, monitored_zones=[],
                  monitored_outputs=[], partitions=[]):
-        """Init the Satel alarm data."""
+        """Init the Satel alarm data.
+
+        The loop argument is unused and kept for backward compatibility.
+        """
         self._host = host
         self._port = port
-        self._loop = loop
-        self._message_handlers = {}
+        self._message_handlers = [None] * 256
         self._monitored_zones = monitored_zones
         self.violated_zones = []
         self._monitored_outputs = monitored_outputs
@@ -138,29 +168,11 @@ class AsyncSatel:
         self._command_status_event = asyncio.Event()
         self._command_status = False
 
-        self._message_handlers[b'\x00'] = self._zone_violated
-        self._message_handlers[b'\x17'] = self._output_changed
-        self._message_handlers[b'\x0A'] = lambda msg: self._armed(
-            AlarmState.ARMED_MODE0, msg)
-        self._message_handlers[b'\x2A'] = lambda msg: self._armed(
-            AlarmState.ARMED_MODE1, msg)
-        self._message_handlers[b'\x0B'] = lambda msg: self._armed(
-            AlarmState.ARMED_MODE2, msg)
-        self._message_handlers[b'\x0C'] = lambda msg: self._armed(
-            AlarmState.ARMED_MODE3, msg)
-        self._message_handlers[b'\x09'] = lambda msg: self._armed(
-            AlarmState.ARMED_SUPPRESSED, msg)
-        self._message_handlers[b'\x0E'] = lambda msg: self._armed(
-            AlarmState.ENTRY_TIME, msg)
-        self._message_handlers[b'\x0F'] = lambda msg: self._armed(
-            AlarmState.EXIT_COUNTDOWN_OVER_10, msg)
-        self._message_handlers[b'\x10'] = lambda msg: self._armed(
-            AlarmState.EXIT_COUNTDOWN_UNDER_10, msg)
-        self._message_handlers[b'\xEF'] = lambda msg: self._command_result(msg)
-        self._message_handlers[b'\x13'] = lambda msg: self._armed(
-            AlarmState.TRIGGERED, msg)
-        self._message_handlers[b'\x14'] = lambda msg: self._armed(
-            AlarmState.TRIGGERED_FIRE, msg)
+        self._message_handlers[0x00] = self._zone_violated
+        self._message_handlers[0x17] = self._output_changed
+        self._message_handlers[0xEF] = self._command_result
+        for msg_id, mode in PARTITION_STATE_MESSAGES.items():
+            self._message_handlers[msg_id] = partial(self._armed, mode)
 
     @property
     def connected(self):
@@ -172,8 +184,9 @@ class AsyncSatel:
         _LOGGER.debug("Connecting...")
 
         try:
-            self._reader, self._writer = await asyncio.open_connection(
-                self._host, self._port)
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self._host, self._port),
+                timeout=self._reconnection_timeout)
             _LOGGER.debug("sucess connecting...")
 
         except Exception as e:
@@ -187,10 +200,7 @@ class AsyncSatel:
 
     async def start_monitoring(self):
         """Start monitoring for interesting events."""
-        data = generate_query(
-            b'\x7F\x01\xDC\x99\x80\x00\x04\x00\x00\x00\x00\x00\x00')
-
-        await self._send_data(data)
+        await self._send_data(START_MONITORING_QUERY)
         resp = await self._read_data()
 
         if resp is None:
@@ -202,14 +212,13 @@ class AsyncSatel:
 
     def _zone_violated(self, msg):
 
-        status = {"zones": {}}
-
         violated_zones = list_set_bits(msg, 32)
         self.violated_zones = violated_zones
         _LOGGER.debug("Violated zones: %s", violated_zones)
-        for zone in self._monitored_zones:
-            status["zones"][zone] = \
-                1 if zone in violated_zones else 0
+        zones = dict.fromkeys(self._monitored_zones, 0)
+        zones.update(dict.fromkeys(
+            set(violated_zones).intersection(self._monitored_zones), 1))
+        status = {"zones": zones}
 
         _LOGGER.debug("Returning status: %s", status)
 
@@ -221,15 +230,14 @@ class AsyncSatel:
     def _output_changed(self, msg):
         """0x17   outputs state 0x17   + 16/32 bytes"""
 
-        status = {"outputs": {}}
-
         output_states = list_set_bits(msg, 32)
         self.violated_outputs = output_states
         _LOGGER.debug("Output states: %s, monitored outputs: %s",
                       output_states, self._monitored_outputs)
-        for output in self._monitored_outputs:
-            status["outputs"][output] = \
-                1 if output in output_states else 0
+        outputs = dict.fromkeys(self._monitored_outputs, 0)
+        outputs.update(dict.fromkeys(
+            set(output_states).intersection(self._monitored_outputs), 1))
+        status = {"outputs": outputs}
 
         _LOGGER.debug("Returning status: %s", status)
 
@@ -240,11 +248,11 @@ class AsyncSatel:
 
     def _command_result(self, msg):
         status = {"error": "Some problem!"}
-        error_code = msg[1:2]
+        error_code = msg[1] if len(msg) > 1 else None
 
-        if error_code in [b'\x00', b'\xFF']:
+        if error_code in (0x00, 0xFF):
             status = {"error": "OK"}
-        elif error_code == b'\x01':
+        elif error_code == 0x01:
             status = {"error": "User code not found"}
 
         _LOGGER.debug("Received error status: %s", status)
@@ -263,9 +271,10 @@ class AsyncSatel:
     #     return self._command_status
 
     async def _send_data(self, data):
-        _LOGGER.debug("-- Sending data --")
-        print_hex(data)
-        _LOGGER.debug("-- ------------- --")
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("-- Sending data --")
+            print_hex(data)
+            _LOGGER.debug("-- ------------- --")
         _LOGGER.debug("Sending %d bytes...", len(data))
 
         if not self._writer:
@@ -284,10 +293,7 @@ class AsyncSatel:
     async def arm(self, code, partition_list, mode=0):
         """Send arming command to the alarm. Modes allowed: from 0 till 3."""
         _LOGGER.debug("Sending arm command, mode: %s!", mode)
-        while len(code) < 16:
-            code += 'F'
-
-        code_bytes = bytearray.fromhex(code)
+        code_bytes = user_code_bytes(code)
         mode_command = 0x80 + mode
         data = generate_query(mode_command.to_bytes(1, 'big')
                               + code_bytes
@@ -298,10 +304,7 @@ class AsyncSatel:
     async def disarm(self, code, partition_list):
         """Send command to disarm."""
         _LOGGER.info("Sending disarm command.")
-        while len(code) < 16:
-            code += 'F'
-
-        code_bytes = bytearray.fromhex(code)
+        code_bytes = user_code_bytes(code)
 
         data = generate_query(b'\x84' + code_bytes
                               + partition_bytes(partition_list))
@@ -311,10 +314,7 @@ class AsyncSatel:
     async def clear_alarm(self, code, partition_list):
         """Send command to clear the alarm."""
         _LOGGER.info("Sending clear the alarm command.")
-        while len(code) < 16:
-            code += 'F'
-
-        code_bytes = bytearray.fromhex(code)
+        code_bytes = user_code_bytes(code)
 
         data = generate_query(b'\x85' + code_bytes
                               + partition_bytes(partition_list))
@@ -329,10 +329,7 @@ class AsyncSatel:
               If function is accepted, function result can be
               checked by observe the system state """
         _LOGGER.debug("Turn on, output: %s, code: %s", output_id, code)
-        while len(code) < 16:
-            code += 'F'
-
-        code_bytes = bytearray.fromhex(code)
+        code_bytes = user_code_bytes(code)
         mode_command = 0x88 if state else 0x89
         data = generate_query(mode_command.to_bytes(1, 'big') +
                               code_bytes +
@@ -345,6 +342,9 @@ class AsyncSatel:
         _LOGGER.debug("Update: list of partitions in mode %s: %s",
                       mode, partitions)
 
+        if self.partition_states.get(mode) == partitions:
+            return
+
         self.partition_states[mode] = partitions
 
         if self._alarm_status_callback:
@@ -355,10 +355,11 @@ class AsyncSatel:
             return []
 
         try:
-            data = await self._reader.readuntil(b'\xFE\x0D')
-            _LOGGER.debug("-- Receiving data --")
-            print_hex(data)
-            _LOGGER.debug("-- ------------- --")
+            data = await self._reader.readuntil(FRAME_END)
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug("-- Receiving data --")
+                print_hex(data)
+                _LOGGER.debug("-- ------------- --")
             return verify_and_strip(data)
 
         except Exception as e:
@@ -367,6 +368,8 @@ class AsyncSatel:
                 "disconnected!", e)
             self._writer = None
             self._reader = None
+            # Forget reported states so they are notified after reconnect
+            self.partition_states.clear()
 
             if self._alarm_status_callback:
                 self._alarm_status_callback()
@@ -381,9 +384,7 @@ class AsyncSatel:
             await asyncio.sleep(self._keep_alive_timeout)
             if self.closed:
                 return
-            # Command to read status of the alarm
-            data = generate_query(b'\xEE\x01\x01')
-            await self._send_data(data)
+            await self._send_data(KEEP_ALIVE_QUERY)
 
     async def _update_status(self):
         _LOGGER.debug("Wait...")
@@ -394,17 +395,22 @@ class AsyncSatel:
             _LOGGER.warning("Got empty response. We think it's disconnect.")
             self._writer = None
             self._reader = None
+            self.partition_states.clear()
             if self._alarm_status_callback:
                 self._alarm_status_callback()
             return
 
-        msg_id = resp[0:1]
-        str_msg_id = ''.join(format(x, '02x') for x in msg_id)
-        if msg_id in self._message_handlers:
-            _LOGGER.info("Calling handler for id: 0x%s", str_msg_id)
-            self._message_handlers[msg_id](resp)
+        handler = self._message_handlers[resp[0]]
+        if handler is not None:
+            _LOGGER.info("Calling handler for id: 0x%02x", resp[0])
+            handler(resp)
         else:
-            _LOGGER.info("Ignoring message: 0x%s", str_msg_id)
+            _LOGGER.info("Ignoring message: 0x%02x", resp[0])
+
+    def _reconnection_delay(self, attempt):
+        """Return exponential backoff with jitter, capped at the timeout."""
+        delay = min(2 ** attempt, self._reconnection_timeout)
+        return random.uniform(delay / 2, delay)
 
     async def monitor_status(self, alarm_status_callback=None,
                              zone_changed_callback=None,
@@ -420,26 +426,41 @@ class AsyncSatel:
 
         _LOGGER.info("Starting monitor_status loop")
 
+        attempt = 0
         while not self.closed:
             _LOGGER.debug("Iteration... ")
-            while not self.connected:
+            while not self.connected and not self.closed:
                 _LOGGER.info("Not connected, re-connecting... ")
                 await self.connect()
+                if self.closed:
+                    break
                 if not self.connected:
-                    _LOGGER.warning("Not connected, sleeping for 10s... ")
-                    await asyncio.sleep(self._reconnection_timeout)
+                    delay = self._reconnection_delay(attempt)
+                    _LOGGER.warning("Not connected, sleeping for %.1fs... ",
+                                    delay)
+                    await asyncio.sleep(delay)
+                    attempt += 1
                     continue
+            if self.closed:
+                break
             await self.start_monitoring()
             if not self.connected:
-                _LOGGER.warning("Start monitoring failed, sleeping for 10s...")
-                await asyncio.sleep(self._reconnection_timeout)
+                delay = self._reconnection_delay(attempt)
+                _LOGGER.warning("Start monitoring failed, sleeping for "
+                                "%.1fs...", delay)
+                await asyncio.sleep(delay)
+                attempt += 1
                 continue
+            attempt = 0
             while True:
                 await self._update_status()
                 _LOGGER.debug("Got status!")
                 if not self.connected:
                     _LOGGER.info("Got connection broken, reconnecting!")
                     break
+        # close() may have been called while a connection was being made
+        if self.connected:
+            self._writer.close()
         _LOGGER.info("Closed, quit monitoring.")
 
     def close(self):
@@ -454,20 +475,17 @@ def demo(host, port):
     """Basic demo of the monitoring capabilities."""
     # logging.basicConfig(level=logging.DEBUG)
 
-    loop = asyncio.get_event_loop()
-    stl = AsyncSatel(host,
-                     port,
-                     loop,
-                     [1, 2, 3, 4, 5, 6, 7, 8, 12, 13, 14, 15, 16, 17, 18, 19,
-                      20, 21, 22, 23, 25, 26, 27, 28, 29, 30],
-                     [8, 9, 10]
-                     )
-
-    loop.run_until_complete(stl.connect())
-    loop.create_task(stl.arm("3333", (1,)))
-    loop.create_task(stl.disarm("3333",(1,)))
-    loop.create_task(stl.keep_alive())
-    loop.create_task(stl.monitor_status())
-
-    loop.run_forever()
-    loop.close()
+    async def run_demo():
+        stl = AsyncSatel(host,
+                         port,
+                         monitored_zones=[1, 2, 3, 4, 5, 6, 7, 8, 12, 13, 14,
+                                          15, 16, 17, 18, 19, 20, 21, 22, 23,
+                                          25, 26, 27, 28, 29, 30],
+                         monitored_outputs=[8, 9, 10])
+
+        await stl.connect()
+        await stl.arm("3333", (1,))
+        await stl.disarm("3333", (1,))
+        await asyncio.gather(stl.keep_alive(), stl.monitor_status())
+
+    asyncio.run(run_demo())
@@ -11,9 +11,7 @@ with open('README.rst') as readme_file:
 with open('HISTORY.rst') as history_file:
     history = history_file.read()
 
-requirements = [
-    'Click>=6.0',
-]
+requirements = []
 
 setup_requirements = [
     'pytest-runner',
@@ -42,6 +40,7 @@ setup(
     },
     include_package_data=True,
     install_requires=requirements,
+    python_requires='>=3.7',
     license="MIT license",
     zip_safe=False,
     keywords='satel_integra',
@@ -51,7 +50,6 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
     ],
     test_suite='tests',
@@ -3,14 +3,15 @@
 
 """Tests for `satel_integra` package."""
 
+import asyncio
 import pytest
 
-# from click.testing import CliRunner
-
-# from satel_integra import cli
-from unittest import TestCase
+from satel_integra import cli
+from unittest import TestCase, mock
 from satel_integra.satel_integra import \
-    checksum, generate_query, verify_and_strip
+    checksum, generate_query, verify_and_strip, list_set_bits, \
+    user_code_bytes, AsyncSatel, AlarmState, KEEP_ALIVE_QUERY, \
+    START_MONITORING_QUERY
 
 # import unittest
 # from unittest.mock import MagicMock
@@ -27,15 +28,19 @@ def response():
 
 
 def test_command_line_interface():
-    """Test the CLI."""
-    # runner = CliRunner()
-    # result = runner.invoke(cli.main)
-    # assert result.exit_code == 0
-    # assert 'satel_integra.cli.main' in result.output
-    # help_result = runner.invoke(cli.main, ['--help'])
-    # assert help_result.exit_code == 0
-    #    assert '--help  Show this message and exit.' in help_result.output
-    pass
+    """Test the CLI runs demo with default connection parameters."""
+    with mock.patch.object(cli, "demo") as demo:
+        cli.main(['--loglevel', 'WARNING'])
+    demo.assert_called_once_with('192.168.2.230', 7094)
+    assert isinstance(demo.call_args[0][1], int)
+
+
+def test_command_line_interface_bad_loglevel():
+    """Test the CLI rejects unknown log level."""
+    with mock.patch.object(cli, "demo") as demo:
+        with pytest.raises(SystemExit):
+            cli.main(['--loglevel', 'bogus'])
+    demo.assert_not_called()
 
 
 test_frames = \
@@ -116,11 +121,186 @@ class TestSatel(TestCase):
         result = generate_query(b'\xEE' + devicenumber + device_type)
         self.assertEqual(result, test_frames["Name query"])
 
+    def test_query_byte_stuffing(self):
+        """Test if 0xFE in command data is escaped and restored."""
+        result = generate_query(b'\x7F\xFE\x01')
+        self.assertEqual(result[:6], b'\xFE\xFE\x7F\xFE\xF0\x01')
+        self.assertEqual(verify_and_strip(result), b'\x7F\xFE\x01')
+
     def test_verify_and_strip(self):
         """Test if verify and strip works ok on reference data."""
         for data in test_frames.values():
             verify_and_strip(data)
 
+    def test_list_set_bits(self):
+        """Test if set bits are listed as 1-based positions, ascending."""
+        data = b'\x00' + b'\x81\x00\x01' + b'\x00' * 28 + b'\x80'
+        self.assertEqual(list_set_bits(data, 32), [1, 8, 17, 256])
+        self.assertEqual(list_set_bits(b'\x0A\x00\x00\x00\x00', 4), [])
+
+    def test_user_code_bytes(self):
+        """Test if user code is padded to 8 bytes as in Arm0 query."""
+        self.assertEqual(user_code_bytes("1111"),
+                         test_frames["Arm0 query"][3:11])
+
+    def test_partition_state_dispatch(self):
+        """Test if partition state frames update respective alarm state."""
+        satel = AsyncSatel("localhost", 7094, None)
+        for name, mode in (("Armed partitions response",
+                            AlarmState.ARMED_MODE0),
+                           ("First partition armed",
+                            AlarmState.ARMED_SUPPRESSED)):
+            msg = verify_and_strip(test_frames[name])
+            satel._message_handlers[msg[0]](msg)
+            self.assertEqual(satel.partition_states[mode], [1])
+
+    def test_alarm_status_callback_on_change_only(self):
+        """Test if repeated partition state does not notify again."""
+        calls = []
+        satel = AsyncSatel("localhost", 7094)
+        satel._alarm_status_callback = lambda: calls.append(True)
+        msg = verify_and_strip(test_frames["First partition armed"])
+        satel._message_handlers[msg[0]](msg)
+        satel._message_handlers[msg[0]](msg)
+        self.assertEqual(len(calls), 1)
+        msg = verify_and_strip(test_frames["First partition disarmed"])
+        satel._message_handlers[msg[0]](msg)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(
+            satel.partition_states[AlarmState.ARMED_SUPPRESSED], [])
+
+    def test_alarm_status_callback_after_reconnect(self):
+        """Test if same partition state is notified again after reconnect."""
+        calls = []
+        satel = AsyncSatel("localhost", 7094)
+        satel._alarm_status_callback = \
+            lambda: calls.append(bool(satel.connected))
+        msg = verify_and_strip(test_frames["First partition armed"])
+
+        satel._reader, satel._writer = object(), object()
+        satel._message_handlers[msg[0]](msg)
+
+        async def no_data():
+            return None
+
+        satel._read_data = no_data
+        asyncio.run(satel._update_status())
+
+        satel._reader, satel._writer = object(), object()
+        satel._message_handlers[msg[0]](msg)
+        self.assertEqual(calls, [True, False, True])
+        self.assertEqual(
+            satel.partition_states[AlarmState.ARMED_SUPPRESSED], [1])
+
+    def test_command_result(self):
+        """Test if command result frames are decoded to error status."""
+        satel = AsyncSatel("localhost", 7094)
+        for name in ("Arm0 response", "Response OK to start monitoring"):
+            msg = verify_and_strip(test_frames[name])
+            self.assertEqual(satel._command_result(msg), {"error": "OK"})
+        self.assertEqual(satel._command_result(b'\xEF\x01'),
+                         {"error": "User code not found"})
+        self.assertEqual(satel._command_result(b'\xEF'),
+                         {"error": "Some problem!"})
+
+    def test_zone_and_output_status(self):
+        """Test if only monitored zones and outputs are reported."""
+        satel = AsyncSatel("localhost", 7094, None, [1, 2, 3], [3, 4])
+        bits = (0b101).to_bytes(32, 'little')
+        self.assertEqual(satel._zone_violated(b'\x00' + bits),
+                         {"zones": {1: 1, 2: 0, 3: 1}})
+        self.assertEqual(satel._output_changed(b'\x17' + bits),
+                         {"outputs": {3: 1, 4: 0}})
+        self.assertEqual(satel.violated_zones, [1, 3])
+
+    def test_reconnection_delay(self):
+        """Test if reconnection delay backs off with jitter up to the cap."""
+        satel = AsyncSatel("localhost", 7094)
+        for attempt in range(7):
+            delay = min(2 ** attempt, satel._reconnection_timeout)
+            for _ in range(50):
+                result = satel._reconnection_delay(attempt)
+                self.assertGreaterEqual(result, delay / 2)
+                self.assertLessEqual(result, delay)
+                self.assertLessEqual(result, satel._reconnection_timeout)
+
+    def test_monitor_status_backoff_when_start_monitoring_fails(self):
+        """Test if dropped start monitoring backs off until it succeeds."""
+        satel = AsyncSatel("localhost", 7094)
+        attempts = []
+        starts = []
+
+        def reconnection_delay(attempt):
+            attempts.append(attempt)
+            if len(attempts) == 3:
+                satel.close()
+            return 0
+
+        async def connect():
+            satel._reader, satel._writer = object(), mock.Mock()
+            return True
+
+        async def start_monitoring():
+            starts.append(True)
+            # Panel accepts monitoring on the third try only
+            if len(starts) != 3:
+                satel._reader = satel._writer = None
+
+        async def update_status():
+            satel._reader = satel._writer = None
+
+        satel._reconnection_delay = reconnection_delay
+        satel.connect = connect
+        satel.start_monitoring = start_monitoring
+        satel._update_status = update_status
+        asyncio.run(asyncio.wait_for(satel.monitor_status(), timeout=1))
+        self.assertEqual(attempts, [0, 1, 0])
+
+    def test_monitor_status_stops_reconnecting_on_close(self):
+        """Test if monitoring finishes when closed while reconnecting."""
+        satel = AsyncSatel("localhost", 7094)
+        satel._reconnection_timeout = 0.01
+        attempts = []
+
+        async def failing_connect():
+            attempts.append(satel.closed)
+            return False
+
+        satel.connect = failing_connect
+
+        async def run():
+            task = asyncio.ensure_future(satel.monitor_status())
+            await asyncio.sleep(0.05)
+            satel.close()
+            await asyncio.wait_for(task, timeout=1)
+
+        asyncio.run(run())
+        self.assertTrue(attempts)
+        self.assertNotIn(True, attempts)
+
+    def test_monitor_status_closed_during_connect(self):
+        """Test if connection made after close is dropped, not monitored."""
+        satel = AsyncSatel("localhost", 7094)
+        writer = mock.Mock()
+
+        async def connect():
+            satel.close()
+            satel._reader, satel._writer = object(), writer
+            return True
+
+        satel.connect = connect
+        satel.start_monitoring = mock.Mock()
+        asyncio.run(asyncio.wait_for(satel.monitor_status(), timeout=1))
+        satel.start_monitoring.assert_not_called()
+        writer.close.assert_called_once_with()
+
+    def test_prebuilt_queries(self):
+        """Test if prebuilt frames match freshly generated ones."""
+        self.assertEqual(KEEP_ALIVE_QUERY, generate_query(b'\xEE\x01\x01'))
+        self.assertEqual(verify_and_strip(START_MONITORING_QUERY),
+                         b'\x7F\x01\xDC\x99\x80\x00\x04\x00\x00\x00'
+                         b'\x00\x00\x00')
+
 # def test_get_version(self):
 #     """Connect and retreive Satel Integra Version. Test bases
 # on captured frames."""